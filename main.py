@@ -2,14 +2,35 @@ import discord
 from discord import app_commands, ui
 from discord.ext import commands, tasks
 import logging
+import logging.handlers
+import queue
+import atexit
 import os
+import sys
+import signal
 import asyncio
 import asyncpg  # PostgreSQL Driver
 import json
-import difflib
+import hashlib
+import functools
+import bisect
+import re
 import random
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from rapidfuzz import fuzz
+
+try:
+    import uvloop  # libuv-based event loop, POSIX only
+except ImportError:
+    uvloop = None
+
+try:
+    import orjson  # installed by discord.py[speed]
+except ImportError:
+    orjson = None
 
 # ------------------------------------------------------------------
 # 1. CONFIGURATION & SETUP
@@ -17,11 +38,17 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s | %(levelname)s | %(name)s | %(message)s',
-    handlers=[logging.StreamHandler()]
-)
+# Log calls on the event loop only enqueue the record; a listener thread does
+# the formatting and the blocking write to stderr.
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter('%(asctime)s | %(levelname)s | %(name)s | %(message)s'))
+log_queue = queue.SimpleQueue()
+log_listener = logging.handlers.QueueListener(log_queue, log_handler)
+queue_handler = logging.handlers.QueueHandler(log_queue)
+queue_handler.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+log_listener.start()
+atexit.register(log_listener.stop)
 logger = logging.getLogger('astra_home')
 
 BRAND_COLOR = 0x5865F2  
@@ -34,6 +61,17 @@ MYSTIC_COLOR = 0x9b59b6
 # Railway/Env Configuration
 DATABASE_URL = os.getenv("DATABASE_URL")
 REVIEW_CHANNEL_ID = int(os.getenv("REVIEW_CHANNEL_ID", 0))
+# asyncpg defaults to 10 idle connections; keep a small warm floor so hosted
+# plans with low connection limits aren't exhausted, and cap bursts.
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 2))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 10))
+
+# Seconds after the interaction was created that /ask may spend looking up
+# candidates before it defers the response (Discord requires the first
+# response within 3 seconds of creation, gateway delivery included).
+ASK_DEFER_AFTER = 2.0
+# Minimum match score for a knowledge-base entry to be offered to the user
+MATCH_THRESHOLD = 0.6
 
 # --- EXPERT CONFIGURATION ---
 # Add the Discord User IDs of your experts here.
@@ -43,38 +81,233 @@ EXPERT_IDS = [
     1451038995545850054
 ]
 
-STATIC_KNOWLEDGE_BASE = []
+# Question words carry no topic; they're dropped before fuzzy matching
+STOPWORDS = frozenset({'who', 'what', 'where', 'when', 'why', 'how', 'is', 'are', 'the', 'a', 'an', 'in', 'of', 'for', 'to', 'do', 'does', 'did'})
+
+# Everything except letters/digits (str.isalnum) and whitespace; \w also admits "_"
+_CLEAN_RE = re.compile(r"[^\w\s]|_")
+
+# Repeated /ask questions and cached DB rows clean the same strings again
+@functools.lru_cache(maxsize=4096)
+def clean_text(text):
+    words = _CLEAN_RE.sub("", text.lower()).split()
+    return " ".join(w for w in words if w not in STOPWORDS)
+
+def option_label(question):
+    # Disambiguation menu label; computed once per entry/row, not per /ask
+    return question[:90] + "..." if len(question) > 90 else question
+
+STATIC_KNOWLEDGE_BASE = ()
 
 def load_knowledge_base():
     global STATIC_KNOWLEDGE_BASE
     file_path = os.path.join("data", "hinduism.jsonl")
     try:
         if not os.path.exists(file_path):
-            logger.warning(f"⚠️ Static Knowledge Base file not found at: {file_path}")
+            logger.warning("⚠️ Static Knowledge Base file not found at: %s", file_path)
             return
-        count = 0
-        with open(file_path, "r", encoding="utf-8") as f:
-            for line in f:
-                if line.strip():
-                    try:
-                        entry = json.loads(line)
-                        if "q" in entry and "a" in entry:
-                            STATIC_KNOWLEDGE_BASE.append(entry)
-                            count += 1
-                    except json.JSONDecodeError:
-                        continue
-        logger.info(f"✅ Loaded {count} static entries.")
+        # One read of the raw bytes; orjson parses UTF-8 bytes directly (json.loads accepts them too)
+        loads = orjson.loads if orjson else json.loads
+        with open(file_path, "rb") as f:
+            data = f.read()
+        entries = []
+        for line in data.splitlines():
+            if line.strip():
+                try:
+                    entry = loads(line)
+                except ValueError:  # JSONDecodeError, or bytes that aren't UTF-8
+                    continue
+                # Skip lines that parse but aren't a {"q": str, "a": str} object,
+                # rather than letting one bad line abort the whole load
+                if isinstance(entry, dict) and isinstance(entry.get("q"), str) and isinstance(entry.get("a"), str):
+                    # Interned so equality checks against the same question are a pointer compare
+                    entry["q"] = sys.intern(entry["q"])
+                    # Matching forms, computed once instead of on every /ask
+                    entry["q_clean"] = clean_text(entry["q"])
+                    entry["q_lower"] = entry["q"].lower()
+                    entry["label"] = option_label(entry["q"])
+                    entries.append(entry)
+        # Read-only from here on; a tuple is smaller and can't be mutated by accident
+        STATIC_KNOWLEDGE_BASE = tuple(entries)
+        logger.info("✅ Loaded %d static entries.", len(entries))
     except Exception as e:
-        logger.error(f"❌ Failed to load Knowledge Base: {e}")
+        logger.error("❌ Failed to load Knowledge Base: %s", e)
 
 # ------------------------------------------------------------------
 # 2. DATABASE MANAGER (POSTGRESQL)
 # ------------------------------------------------------------------
 
+# Recent /ask lookups are memoized in-process; the FAQ is read-mostly and the
+# same questions get asked over and over. Any write to faq clears the cache.
+SEARCH_CACHE_SIZE = 512
+SEARCH_CACHE_TTL = 300  # seconds
+# /profile rows, short-lived; karma/meditation/daily writes drop the user's entry
+PROFILE_CACHE_SIZE = 10_000
+PROFILE_CACHE_TTL = 30  # seconds
+# Karma awards are summed per user in memory and written in one batch this long
+# after the first pending award.
+KARMA_FLUSH_DELAY = 0.25  # seconds
+# A failed write is retried with doubling delays up to this cap
+KARMA_RETRY_MAX = 30  # seconds
+
+# Word tokens for the tsquery (letters/digits in any script, no underscores)
+_WORD_RE = re.compile(r"[^\W_]+")
+
+@functools.lru_cache(maxsize=1024)
+def build_tsquery(text: str) -> str:
+    # OR the query words together so a question matches on any shared term, as a
+    # prefix (":*") so partial words like "medit" still hit "meditation".
+    return " | ".join(f"{tok}:*" for tok in _WORD_RE.findall(text))
+
+# Hot-path statements live at module scope so every call passes the identical
+# string; asyncpg prepares each one once per pooled connection and reuses the
+# cached plan on subsequent calls.
+SQL_ADD_QA = """
+    INSERT INTO faq (question_text, answer_text, author_id, approver_id)
+    VALUES ($1, $2, $3, $4)
+"""
+
+SQL_SEARCH_FTS = """
+    SELECT question_text, answer_text, id
+    FROM faq, to_tsquery('english', $1) AS q
+    WHERE question_tsv @@ q
+    ORDER BY ts_rank(question_tsv, q) DESC
+    LIMIT 15
+"""
+
+# Two index-friendly halves instead of one OR that forces a full scan:
+# "question contains query" is served by the pg_trgm index (when available),
+# "query contains question" only needs questions no longer than the query.
+SQL_SEARCH_LIKE = """
+    (SELECT question_text, answer_text, id FROM faq
+     WHERE question_text ILIKE $1
+     LIMIT 15)
+    UNION
+    (SELECT question_text, answer_text, id FROM faq
+     WHERE length(question_text) <= $2 AND $1 ILIKE ('%' || question_text || '%')
+     LIMIT 15)
+    LIMIT 15
+"""
+
+# Typo-tolerant last resort ("wat is karama"): trigram similarity, served by the
+# same pg_trgm index. Only used when the extension could be installed.
+SQL_SEARCH_TRGM = """
+    SELECT question_text, answer_text, id
+    FROM faq
+    WHERE question_text % $1
+    ORDER BY similarity(question_text, $1) DESC
+    LIMIT 15
+"""
+
+SQL_UPDATE_KARMA = """
+    INSERT INTO users (user_id, karma) VALUES ($1, $2)
+    ON CONFLICT (user_id) DO UPDATE SET karma = users.karma + $2
+"""
+
+# Cooldown check and reward in one round trip. The conditional DO UPDATE
+# re-checks the locked row, so concurrent calls can't both be rewarded; "prev" is
+# the statement's snapshot and is only used to report the remaining wait.
+SQL_RECORD_MEDITATION = """
+    WITH prev AS (
+        SELECT last_meditation FROM users WHERE user_id = $1
+    ), upsert AS (
+        INSERT INTO users (user_id, karma, meditations, last_meditation)
+        VALUES ($1, 10, 1, $2)
+        ON CONFLICT (user_id) DO UPDATE SET
+            karma = users.karma + 10,
+            meditations = users.meditations + 1,
+            last_meditation = EXCLUDED.last_meditation
+        WHERE users.last_meditation IS NULL
+           OR users.last_meditation <= EXCLUDED.last_meditation - INTERVAL '1 hour'
+        RETURNING 1
+    )
+    SELECT EXISTS (SELECT 1 FROM upsert) AS recorded,
+           (SELECT last_meditation FROM prev) AS last_meditation
+"""
+
+# Same single-statement cooldown pattern as SQL_RECORD_MEDITATION
+SQL_CLAIM_DAILY = """
+    WITH prev AS (
+        SELECT last_daily FROM users WHERE user_id = $1
+    ), upsert AS (
+        INSERT INTO users (user_id, karma, last_daily)
+        VALUES ($1, 50, $2)
+        ON CONFLICT (user_id) DO UPDATE SET
+            karma = users.karma + 50,
+            last_daily = EXCLUDED.last_daily
+        WHERE users.last_daily IS NULL
+           OR users.last_daily <= EXCLUDED.last_daily - INTERVAL '24 hours'
+        RETURNING 1
+    )
+    SELECT EXISTS (SELECT 1 FROM upsert) AS claimed,
+           (SELECT last_daily FROM prev) AS last_daily
+"""
+
+SQL_USER_PROFILE = "SELECT karma, meditations FROM users WHERE user_id = $1"
+
+SQL_GET_META = "SELECT value FROM bot_meta WHERE key = $1"
+
+SQL_SET_META = """
+    INSERT INTO bot_meta (key, value) VALUES ($1, $2)
+    ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+"""
+
+# Idempotent schema setup and migrations. Startup compares its hash with the one
+# stored in bot_meta, so editing this text is what makes the next start re-run it.
+SQL_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS faq (
+        id SERIAL PRIMARY KEY,
+        question_text TEXT NOT NULL,
+        answer_text TEXT NOT NULL,
+        author_id BIGINT,
+        approver_id BIGINT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        use_count INTEGER DEFAULT 0
+    );
+    -- Tables created before created_at had a default
+    ALTER TABLE faq ALTER COLUMN created_at SET DEFAULT CURRENT_TIMESTAMP;
+
+    -- Plain B-tree on the full text: no query can use it (searches go through
+    -- question_tsv / ILIKE) and long questions overflow its row size limit.
+    DROP INDEX IF EXISTS idx_question;
+
+    -- Full-text search: generated tsvector kept in sync by Postgres itself
+    ALTER TABLE faq ADD COLUMN IF NOT EXISTS question_tsv tsvector
+        GENERATED ALWAYS AS (to_tsvector('english', question_text)) STORED;
+    CREATE INDEX IF NOT EXISTS idx_faq_question_tsv ON faq USING GIN (question_tsv);
+    CREATE INDEX IF NOT EXISTS idx_faq_question_len ON faq (length(question_text));
+
+    CREATE TABLE IF NOT EXISTS users (
+        user_id BIGINT PRIMARY KEY,
+        karma INTEGER DEFAULT 0,
+        meditations INTEGER DEFAULT 0,
+        last_meditation TIMESTAMP,
+        last_daily TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS bot_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+"""
+SCHEMA_SIGNATURE = hashlib.blake2b(SQL_SCHEMA.encode(), digest_size=16).hexdigest()
+
+SQL_HAS_TRGM_INDEX = "SELECT to_regclass('idx_faq_question_trgm') IS NOT NULL"
+
 class DatabaseManager:
     def __init__(self, db_url: str):
         self.db_url = db_url
         self.pool = None
+        self._search_cache = OrderedDict()
+        self._search_generation = 0  # bumped whenever the faq table changes
+        self._profile_cache = OrderedDict()
+        self._profile_generation = 0  # bumped by every write to any user's row
+        self._pending_karma = {}
+        self._flushing = {}  # batch sent but not yet committed
+        self._karma_timer = None  # TimerHandle for the next flush
+        self._karma_write = None  # flush task currently writing
+        self._closing = False
+        self.trgm_enabled = False
 
     async def initialize(self):
         if not self.db_url:
@@ -82,104 +315,253 @@ class DatabaseManager:
             return
 
         # Create connection pool
+        # Session tuning applied once per pooled connection:
+        #  - synchronous_commit=off: commits return before the WAL flush (a crash
+        #    can lose the last few ms of karma/meditation/daily writes, never
+        #    corrupts data). add_qa opts back in for approved answers.
+        #  - jit=off: our queries are tiny OLTP lookups; JIT compile only adds latency.
+        #  - lock_timeout / command_timeout: a blocked or stuck query fails fast
+        #    instead of holding an interaction (and a pool slot) indefinitely.
         try:
-            self.pool = await asyncpg.create_pool(self.db_url)
+            self.pool = await asyncpg.create_pool(
+                self.db_url,
+                min_size=DB_POOL_MIN,
+                max_size=DB_POOL_MAX,
+                statement_cache_size=128,
+                command_timeout=10,
+                server_settings={
+                    'application_name': 'astra_home',
+                    'synchronous_commit': 'off',
+                    'jit': 'off',
+                    'lock_timeout': '5s',
+                },
+            )
         except Exception as e:
-            logger.critical(f"❌ Failed to connect to Postgres: {e}")
+            logger.critical("❌ Failed to connect to Postgres: %s", e)
             return
+        self._closing = False
 
-        # Create Tables
         async with self.pool.acquire() as conn:
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS faq (
-                    id SERIAL PRIMARY KEY,
-                    question_text TEXT NOT NULL,
-                    answer_text TEXT NOT NULL,
-                    author_id BIGINT,
-                    approver_id BIGINT,
-                    created_at TIMESTAMP,
-                    use_count INTEGER DEFAULT 0
-                );
-                
-                CREATE INDEX IF NOT EXISTS idx_question ON faq(question_text);
-
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id BIGINT PRIMARY KEY,
-                    karma INTEGER DEFAULT 0,
-                    meditations INTEGER DEFAULT 0,
-                    last_meditation TIMESTAMP,
-                    last_daily TIMESTAMP
-                );
-            """)
+            # The DDL takes table locks (ALTER TABLE ... SET DEFAULT is ACCESS EXCLUSIVE);
+            # only run it when SQL_SCHEMA differs from what was last applied
+            try:
+                applied = await conn.fetchval(SQL_GET_META, "schema_signature")
+            except asyncpg.UndefinedTableError:
+                applied = None  # fresh database, bot_meta doesn't exist yet
+            if applied != SCHEMA_SIGNATURE:
+                # One transaction: a failure part-way leaves neither a half-applied
+                # schema nor a signature saying it was applied
+                async with conn.transaction():
+                    await conn.execute(SQL_SCHEMA)
+                    await conn.execute(SQL_SET_META, "schema_signature", SCHEMA_SIGNATURE)
+                logger.info("🔄 Database schema applied")
+
+            # Trigram index lets the ILIKE fallback avoid a sequential scan.
+            # pg_trgm ships with Postgres but some hosts don't allow installing it,
+            # so keep retrying on startup until the index exists.
+            try:
+                if not await conn.fetchval(SQL_HAS_TRGM_INDEX):
+                    await conn.execute("""
+                        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+                        CREATE INDEX IF NOT EXISTS idx_faq_question_trgm ON faq USING GIN (question_text gin_trgm_ops);
+                    """)
+                self.trgm_enabled = True
+            except asyncpg.PostgresError as e:
+                logger.warning("⚠️ pg_trgm unavailable, ILIKE fallback will scan: %s", e)
         logger.info("✅ Connected to PostgreSQL Database")
 
+    def _acquire(self):
+        # initialize() logs and leaves pool unset if Postgres was unreachable
+        if self.pool is None:
+            raise RuntimeError("Database is not connected")
+        return self.pool.acquire()
+
     async def add_qa(self, question: str, answer: str, author_id: int, approver_id: int):
-        async with self.pool.acquire() as conn:
-            await conn.execute(
-                """INSERT INTO faq (question_text, answer_text, author_id, approver_id, created_at)
-                   VALUES ($1, $2, $3, $4, $5)""",
-                question, answer, author_id, approver_id, datetime.now()
-            )
+        async with self._acquire() as conn:
+            # An expert-approved answer can't be re-derived, so wait for the WAL flush
+            async with conn.transaction():
+                await conn.execute("SET LOCAL synchronous_commit = on")
+                await conn.execute(SQL_ADD_QA, question, answer, author_id, approver_id)
+        self._search_generation += 1
+        self._search_cache.clear()
 
     async def search_candidates(self, query: str):
-        async with self.pool.acquire() as conn:
-            # ILIKE for case-insensitive search
-            rows = await conn.fetch(
-                """SELECT question_text, answer_text, id 
-                FROM faq 
-                WHERE question_text ILIKE $1 OR $1 ILIKE ('%' || question_text || '%')
-                LIMIT 15""",
-                f"%{query}%"
-            )
-            return [{'q': r['question_text'], 'a': r['answer_text'], 'source': 'db', 'id': r['id']} for r in rows]
+        # Collapse case and whitespace so "What is  Karma? " and "what is karma?"
+        # share one entry. Casefold (full Unicode case folding) rather than lower(),
+        # and the SQL gets that same text, so one key always means one set of rows.
+        text = " ".join(query.casefold().split())
+        cached = self._search_cache.get(text)
+        if cached and time.monotonic() - cached[0] < SEARCH_CACHE_TTL:
+            self._search_cache.move_to_end(text)
+            return cached[1]
+        if self.pool is None:
+            # No DB: /ask still answers from the static knowledge base
+            return []
+
+        # The GIN index on question_tsv turns this into a posting-list lookup
+        terms = build_tsquery(text)
+        generation = self._search_generation
+        async with self._acquire() as conn:
+            rows = []
+            if terms:
+                rows = await conn.fetch(SQL_SEARCH_FTS, terms)
+            if not rows:
+                # No FTS hit (e.g. only stopwords): fall back to ILIKE substring search
+                pattern = f"%{text}%"
+                rows = await conn.fetch(SQL_SEARCH_LIKE, pattern, len(pattern))
+            if not rows and self.trgm_enabled:
+                rows = await conn.fetch(SQL_SEARCH_TRGM, text)
+        # Normalize each row once here; cached results are then rescored for free
+        results = [
+            {'q': r['question_text'], 'a': r['answer_text'], 'source': 'db', 'id': r['id'],
+             'q_clean': clean_text(r['question_text']), 'q_lower': r['question_text'].lower(),
+             'label': option_label(r['question_text'])}
+            for r in rows
+        ]
+
+        # Rows fetched before an add_qa committed may miss the new answer; don't cache them
+        if self._search_generation != generation:
+            return results
+        self._search_cache[text] = (time.monotonic(), results)
+        self._search_cache.move_to_end(text)
+        if len(self._search_cache) > SEARCH_CACHE_SIZE:
+            self._search_cache.popitem(last=False)
+        return results
 
     async def update_karma(self, user_id: int, points: int):
-        async with self.pool.acquire() as conn:
-            await conn.execute("""
-                INSERT INTO users (user_id, karma) VALUES ($1, $2)
-                ON CONFLICT (user_id) DO UPDATE SET karma = users.karma + $2
-            """, user_id, points)
+        if self.pool is None:
+            raise RuntimeError("Database is not connected")
+        # A burst of quiz answers becomes one executemany instead of a commit each
+        self._pending_karma[user_id] = self._pending_karma.get(user_id, 0) + points
+        # While a write is in flight, its completion schedules the next flush
+        if self._karma_timer is None and self._karma_write is None:
+            self._schedule_karma_flush(KARMA_FLUSH_DELAY)
+
+    def _schedule_karma_flush(self, delay: float):
+        self._karma_timer = asyncio.get_running_loop().call_later(delay, self._start_karma_write, delay)
+
+    def _start_karma_write(self, delay: float):
+        self._karma_timer = None
+        self._karma_write = asyncio.create_task(self._write_karma(delay))
+
+    async def _write_karma(self, delay: float):
+        ok = await self.flush_karma()
+        self._karma_write = None
+        if self._pending_karma and not self._closing:
+            # Awards that arrived mid-write go out after the usual delay; a failed
+            # batch backs off so an outage isn't hammered every 250ms
+            self._schedule_karma_flush(KARMA_FLUSH_DELAY if ok else min(delay * 2, KARMA_RETRY_MAX))
+
+    async def flush_karma(self) -> bool:
+        if not self._pending_karma:
+            return True
+        pending, self._pending_karma = self._pending_karma, {}
+        self._flushing = pending
+        try:
+            # executemany runs in a single implicit transaction
+            async with self._acquire() as conn:
+                await conn.executemany(SQL_UPDATE_KARMA, pending.items())
+        except Exception as e:
+            logger.error("❌ Failed to write karma for %d users: %s", len(pending), e)
+            # Keep the awards for the retry
+            for user_id, points in pending.items():
+                self._pending_karma[user_id] = self._pending_karma.get(user_id, 0) + points
+            self._flushing = {}
+            return False
+        for user_id in pending:
+            self._invalidate_profile(user_id)
+        # Only now: until the commit, reads still need the batch added on top
+        self._flushing = {}
+        return True
 
     async def record_meditation(self, user_id: int):
         now = datetime.now()
-        async with self.pool.acquire() as conn:
-            val = await conn.fetchval("SELECT last_meditation FROM users WHERE user_id = $1", user_id)
-            
-            if val:
-                if now - val < timedelta(hours=1):
-                    return False, (timedelta(hours=1) - (now - val))
-
-            await conn.execute("""
-                INSERT INTO users (user_id, karma, meditations, last_meditation) 
-                VALUES ($1, 10, 1, $2)
-                ON CONFLICT (user_id) DO UPDATE SET 
-                    karma = users.karma + 10, 
-                    meditations = users.meditations + 1,
-                    last_meditation = $2
-            """, user_id, now)
+        async with self._acquire() as conn:
+            row = await conn.fetchrow(SQL_RECORD_MEDITATION, user_id, now)
+        if row['recorded']:
+            self._invalidate_profile(user_id)
             return True, None
+        last = row['last_meditation']
+        if last is None or now - last >= timedelta(hours=1):
+            # Lost a race with a concurrent /meditate that just recorded one
+            last = now
+        return False, (timedelta(hours=1) - (now - last))
 
     async def claim_daily(self, user_id: int):
         now = datetime.now()
-        async with self.pool.acquire() as conn:
-            val = await conn.fetchval("SELECT last_daily FROM users WHERE user_id = $1", user_id)
-            
-            if val:
-                if now - val < timedelta(hours=24):
-                    return False, (timedelta(hours=24) - (now - val))
-            
-            await conn.execute("""
-                INSERT INTO users (user_id, karma, last_daily) 
-                VALUES ($1, 50, $2)
-                ON CONFLICT (user_id) DO UPDATE SET 
-                    karma = users.karma + 50, 
-                    last_daily = $2
-            """, user_id, now)
+        async with self._acquire() as conn:
+            row = await conn.fetchrow(SQL_CLAIM_DAILY, user_id, now)
+        if row['claimed']:
+            self._invalidate_profile(user_id)
             return True, None
+        last = row['last_daily']
+        if last is None or now - last >= timedelta(hours=24):
+            # Lost a race with a concurrent /daily that just claimed it
+            last = now
+        return False, (timedelta(hours=24) - (now - last))
 
     async def get_user_profile(self, user_id: int):
+        if user_id in self._flushing and self._karma_write is not None:
+            # A read racing the commit can't tell whether its row already includes
+            # the batch; wait for the (single, short) write so it's counted once
+            await asyncio.shield(self._karma_write)
+        row = await self._load_profile(user_id)
+        # Awards not yet committed (queued, or a batch close() is writing) aren't
+        # in the DB or the cache
+        pending = self._pending_karma.get(user_id, 0) + self._flushing.get(user_id, 0)
+        if pending:
+            karma, meditations = row if row else (0, 0)
+            return karma + pending, meditations
+        return row
+
+    def _invalidate_profile(self, user_id: int):
+        self._profile_generation += 1
+        self._profile_cache.pop(user_id, None)
+
+    async def _load_profile(self, user_id: int):
+        cached = self._profile_cache.get(user_id)
+        if cached and time.monotonic() - cached[0] < PROFILE_CACHE_TTL:
+            self._profile_cache.move_to_end(user_id)
+            return cached[1]
+        generation = self._profile_generation
+        async with self._acquire() as conn:
+            row = await conn.fetchrow(SQL_USER_PROFILE, user_id)
+
+        # A write that landed during the fetch may not be in this row; don't pin it.
+        # (Any write counts: one global counter can't grow, a per-user map would.)
+        if self._profile_generation != generation:
+            return row
+        self._profile_cache[user_id] = (time.monotonic(), row)
+        self._profile_cache.move_to_end(user_id)
+        if len(self._profile_cache) > PROFILE_CACHE_SIZE:
+            self._profile_cache.popitem(last=False)
+        return row
+
+    async def get_meta(self, key: str):
+        if self.pool is None:
+            return None
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval(SQL_GET_META, key)
+
+    async def set_meta(self, key: str, value: str):
+        if self.pool is None:
+            return
         async with self.pool.acquire() as conn:
-            return await conn.fetchrow("SELECT karma, meditations FROM users WHERE user_id = $1", user_id)
+            await conn.execute(SQL_SET_META, key, value)
+
+    async def close(self):
+        self._closing = True
+        if self._karma_timer is not None:
+            self._karma_timer.cancel()
+            self._karma_timer = None
+        if self._karma_write is not None:
+            # Let an in-flight batch finish rather than cutting it off mid-write
+            await self._karma_write
+        if self.pool is not None:
+            await self.flush_karma()
+            await self.pool.close()
+            self.pool = None
+            logger.info("🔌 PostgreSQL pool closed")
 
 # Initialize
 db_manager = DatabaseManager(DATABASE_URL)
@@ -224,6 +606,20 @@ class QuizView(ui.View):
 # 4. ADMIN & Q&A COMPONENTS
 # ------------------------------------------------------------------
 
+# Ticket embed markup. The review views read the question back out of the
+# embed description, so the builders and parsers below must share these.
+TICKET_INQUIRY = "**Inquiry:**\n"
+DRAFT_INQUIRY = "**Inquiry:** "
+DRAFT_ANSWER = "\n\n**Proposed Answer:**\n"
+
+def parse_ticket_question(description: str) -> str:
+    return description.removeprefix(TICKET_INQUIRY).strip()
+
+def parse_draft(description: str):
+    # -> (question, proposed answer) from a drafted ticket embed
+    head, _, tail = description.partition(DRAFT_ANSWER)
+    return head.removeprefix(DRAFT_INQUIRY).strip(), tail.strip()
+
 class AdminReviewView(ui.View):
     def __init__(self):
         super().__init__(timeout=None) 
@@ -232,8 +628,7 @@ class AdminReviewView(ui.View):
     async def answer_button(self, interaction: discord.Interaction, button: ui.Button):
         # Open to EVERYONE (as requested)
         embed = interaction.message.embeds[0]
-        description = embed.description or ""
-        question_text = description.replace("**Inquiry:**\n", "").strip()
+        question_text = parse_ticket_question(embed.description or "")
         await interaction.response.send_modal(AnswerModal(question_text))
 
     @ui.button(label="Discard", style=discord.ButtonStyle.secondary, emoji="🗑️", custom_id="qa_btn_delete")
@@ -257,19 +652,20 @@ class AnswerModal(ui.Modal, title="Astra Home | Draft Response"):
         original_embed = interaction.message.embeds[0]
         new_embed = discord.Embed(
             title="🛡️ Response Pending Approval",
-            description=f"**Inquiry:** {self.question_text}\n\n**Proposed Answer:**\n{self.answer_input.value}",
+            description=f"{DRAFT_INQUIRY}{self.question_text}{DRAFT_ANSWER}{self.answer_input.value}",
             color=WARNING_COLOR
         )
         for field in original_embed.fields:
             new_embed.add_field(name=field.name, value=field.value, inline=field.inline)
         new_embed.set_footer(text=f"Drafted by {interaction.user.display_name} • Approval Required")
-        await interaction.message.edit(embed=new_embed, view=ApprovalView(self.answer_input.value))
+        await interaction.message.edit(embed=new_embed, view=interaction.client.approval_view)
         await interaction.response.defer()
 
 class ApprovalView(ui.View):
-    def __init__(self, answer_text):
+    # Stateless: the draft lives in the message embed, so this view is registered
+    # once in setup_hook and keeps working for pending tickets across restarts.
+    def __init__(self):
         super().__init__(timeout=None)
-        self.answer_text = answer_text
 
     @ui.button(label="Publish Publicly", style=discord.ButtonStyle.success, emoji="📢", custom_id="qa_btn_approve")
     async def approve(self, interaction: discord.Interaction, button: ui.Button):
@@ -279,11 +675,12 @@ class ApprovalView(ui.View):
             return
 
         embed = interaction.message.embeds[0]
-        user_id = int(discord.utils.get(embed.fields, name="User ID").value)
-        channel_id = int(discord.utils.get(embed.fields, name="Channel ID").value)
-        question_text = embed.description.split("\n\n**Proposed Answer:**")[0].replace("**Inquiry:** ", "").strip()
+        fields = {field.name: field.value for field in embed.fields}
+        user_id = int(fields["User ID"])
+        channel_id = int(fields["Channel ID"])
+        question_text, answer_text = parse_draft(embed.description)
         
-        await db_manager.add_qa(question_text, self.answer_text, user_id, interaction.user.id)
+        await db_manager.add_qa(question_text, answer_text, user_id, interaction.user.id)
         await db_manager.update_karma(interaction.user.id, 15)
 
         # Cross-Server Messaging Logic
@@ -292,7 +689,7 @@ class ApprovalView(ui.View):
         if target_channel:
             success_embed = discord.Embed(
                 title="✨ Astra Home | New Knowledge Added",
-                description=f"**Q:** {question_text}\n\n**A:** {self.answer_text}",
+                description=f"**Q:** {question_text}\n\n**A:** {answer_text}",
                 color=SUCCESS_COLOR
             )
             success_embed.set_footer(text=f"Answered by Expert: {interaction.user.display_name}")
@@ -301,7 +698,7 @@ class ApprovalView(ui.View):
             except discord.Forbidden:
                 await interaction.followup.send("⚠️ Saved to DB, but failed to message user (Permissions).", ephemeral=True)
             except Exception as e:
-                logger.error(f"Failed to send message to channel {channel_id}: {e}")
+                logger.error("Failed to send message to channel %s: %s", channel_id, e)
         else:
             await interaction.followup.send("⚠️ Saved to DB, but could not find the original channel.", ephemeral=True)
         
@@ -322,6 +719,41 @@ class ApprovalView(ui.View):
 # 5. DISAMBIGUATION & SUBMISSION LOGIC
 # ------------------------------------------------------------------
 
+# /ask reply templates, built once. The static ones are sent as-is;
+# knowledge_embed() copies the answer template and fills in the entry.
+KNOWLEDGE_EMBED = discord.Embed(title="🕉️ Knowledge Base", color=SUCCESS_COLOR)
+NO_ANSWER_EMBED = discord.Embed(
+    title="🤔 No Answer Found",
+    description="I couldn't find a matching answer in the scriptures. Would you like to send this question to our **Experts**?",
+    color=WARNING_COLOR
+)
+MATCHES_EMBED = discord.Embed(title="🔍 I found potential matches", description="Select the correct question, or send yours to the experts:", color=INFO_COLOR)
+SENT_EMBED = discord.Embed(
+    description="✅ **Sent!** Your question has been forwarded to the **Astra Home Experts**.",
+    color=SUCCESS_COLOR
+)
+
+SEND_FAILED_MSG = "⚠️ Sorry, your question couldn't be delivered to the experts. Please try again later."
+
+def knowledge_embed(entry):
+    embed = KNOWLEDGE_EMBED.copy()
+    embed.description = entry['a']
+    embed.add_field(name="Topic", value=entry['q'])
+    return embed
+
+# Review-channel ticket: everything but the asker, question and time is fixed
+TICKET_EMBED = discord.Embed(title="📨 New Question Received", color=BRAND_COLOR)
+TICKET_EMBED.set_footer(text="Awaiting Expert Answer")
+
+def ticket_embed(user, question, channel_id):
+    embed = TICKET_EMBED.copy()
+    embed.description = f"{TICKET_INQUIRY}{question}"
+    embed.timestamp = discord.utils.utcnow()
+    embed.set_author(name=f"{user.display_name}", icon_url=user.display_avatar.url)
+    embed.add_field(name="User ID", value=str(user.id), inline=True)
+    embed.add_field(name="Channel ID", value=str(channel_id), inline=True)
+    return embed
+
 class DisambiguationSelect(ui.Select):
     def __init__(self, candidates, bot, user, original_question):
         self.candidates = candidates
@@ -331,8 +763,7 @@ class DisambiguationSelect(ui.Select):
         
         options = []
         for i, c in enumerate(candidates[:24]):
-            label = c['q'][:90] + "..." if len(c['q']) > 90 else c['q']
-            options.append(discord.SelectOption(label=label, value=str(i), emoji="🕉️"))
+            options.append(discord.SelectOption(label=c['label'], value=str(i), emoji="🕉️"))
             
         options.append(discord.SelectOption(
             label="None of these / Send to Experts", 
@@ -354,30 +785,16 @@ class DisambiguationSelect(ui.Select):
                 await interaction.response.send_message("⚠️ System Error: Review channel unavailable.", ephemeral=True)
                 return
 
-            embed = discord.Embed(
-                title="📨 New Question Received",
-                description=f"**Inquiry:**\n{self.original_question}",
-                color=BRAND_COLOR,
-                timestamp=discord.utils.utcnow()
-            )
-            embed.set_author(name=f"{self.user.display_name}", icon_url=self.user.display_avatar.url)
-            embed.add_field(name="User ID", value=str(self.user.id), inline=True)
-            embed.add_field(name="Channel ID", value=str(interaction.channel_id), inline=True)
-            embed.set_footer(text="Awaiting Expert Answer")
+            embed = ticket_embed(self.user, self.original_question, interaction.channel_id)
 
-            await review_channel.send(embed=embed, view=AdminReviewView())
-            
-            confirm_embed = discord.Embed(
-                description=f"✅ **Sent!** Your question has been forwarded to the **Astra Home Experts**.",
-                color=SUCCESS_COLOR
-            )
-            await interaction.response.edit_message(embed=confirm_embed, view=None)
+            # Acknowledge first: a failed send's followup needs an answered interaction
+            await interaction.response.edit_message(embed=SENT_EMBED, view=None)
+
+            self.bot.send_in_background(review_channel, interaction, embed=embed, view=self.bot.admin_review_view)
 
         else:
             selection = self.candidates[int(self.values[0])]
-            embed = discord.Embed(title="🕉️ Knowledge Base", description=selection['a'], color=SUCCESS_COLOR)
-            embed.add_field(name="Topic", value=selection['q'])
-            await interaction.response.edit_message(embed=embed, view=None)
+            await interaction.response.edit_message(embed=knowledge_embed(selection), view=None)
 
 class DisambiguationView(ui.View):
     def __init__(self, candidates, bot, user, original_question):
@@ -405,24 +822,11 @@ class ConfirmSubmissionView(ui.View):
             await interaction.followup.send("⚠️ System Error: Review channel unavailable.", ephemeral=True)
             return
 
-        embed = discord.Embed(
-            title="📨 New Question Received",
-            description=f"**Inquiry:**\n{self.question}",
-            color=BRAND_COLOR,
-            timestamp=discord.utils.utcnow()
-        )
-        embed.set_author(name=f"{self.user.display_name}", icon_url=self.user.display_avatar.url)
-        embed.add_field(name="User ID", value=str(self.user.id), inline=True)
-        embed.add_field(name="Channel ID", value=str(interaction.channel_id), inline=True)
-        embed.set_footer(text="Awaiting Expert Answer")
+        embed = ticket_embed(self.user, self.question, interaction.channel_id)
 
-        await review_channel.send(embed=embed, view=AdminReviewView())
+        self.bot.send_in_background(review_channel, interaction, embed=embed, view=self.bot.admin_review_view)
         
-        confirm_embed = discord.Embed(
-            description=f"✅ **Sent!** Your question has been forwarded to the **Astra Home Experts**.",
-            color=SUCCESS_COLOR
-        )
-        await interaction.followup.send(embed=confirm_embed, ephemeral=True)
+        await interaction.followup.send(embed=SENT_EMBED, ephemeral=True)
 
     @ui.button(label="Cancel", style=discord.ButtonStyle.secondary, emoji="❌")
     async def cancel(self, interaction: discord.Interaction, button: ui.Button):
@@ -436,109 +840,262 @@ class ConfirmSubmissionView(ui.View):
 # 6. BOT COMMANDS
 # ------------------------------------------------------------------
 
+# "Listening to ..." presence texts, rotated every 10 minutes
+STATUS_MESSAGES = (
+    "/ask | Vedic Wisdom",
+    "Helping Seekers",
+    "Reading scriptures...",
+    "Meditating on Dharma",
+    "/quiz | Test Knowledge",
+)
+
 class AstraHomeBot(commands.Bot):
     def __init__(self):
-        intents = discord.Intents.default()
-        intents.message_content = True 
+        # Everything is slash commands and components, which arrive as interactions
+        # regardless of intents. Only the guild/channel cache is needed (for the
+        # review channel lookup); skip member, presence and message caching.
+        intents = discord.Intents(guilds=True)
         super().__init__(
             command_prefix=commands.when_mentioned,
             intents=intents,
             help_command=None,
+            max_messages=None,
+            chunk_guilds_at_startup=False,
+            member_cache_flags=discord.MemberCacheFlags.none(),
             activity=discord.Activity(type=discord.ActivityType.listening, name="/ask")
         )
+        # Strong refs to in-flight background sends (the loop only keeps weak ones)
+        self._pending_sends = set()
+        # Persistent review views, created in setup_hook (discord.py < 2.7 needs a
+        # running loop to build a View)
+        self.admin_review_view = None
+        self.approval_view = None
 
     async def setup_hook(self):
-        load_knowledge_base()
-        await db_manager.initialize()
+        # Parsing the KB file is blocking CPU work; do it on a worker thread while
+        # the pool connects and the schema is checked
+        await asyncio.gather(asyncio.to_thread(load_knowledge_base), db_manager.initialize())
         await self.add_cog(QACog(self))
-        await self.tree.sync()
+        self.tree.on_error = self.on_app_command_error
+        # Neither review view keeps per-message state (everything is read back from
+        # the embed and dispatch is by custom_id), so one instance of each serves
+        # every ticket.
+        self.admin_review_view = AdminReviewView()
+        self.approval_view = ApprovalView()
+        self.add_view(self.admin_review_view)
+        self.add_view(self.approval_view)
+        await self.sync_commands()
         self.rotate_status.start()
 
+    async def sync_commands(self):
+        # A global sync is a rate-limited REST call; only push the tree when the
+        # command definitions differ from what was last synced for this app.
+        payload = json.dumps([cmd.to_dict(self.tree) for cmd in self.tree.get_commands()], sort_keys=True)
+        signature = hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+        meta_key = f"command_signature:{self.application_id}"
+        if await db_manager.get_meta(meta_key) == signature:
+            logger.info("✅ Command tree unchanged, skipping sync")
+            return
+        await self.tree.sync()
+        await db_manager.set_meta(meta_key, signature)
+        logger.info("🔄 Command tree synced")
+
+    async def on_app_command_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        if isinstance(error, app_commands.CommandOnCooldown):
+            # Throttled before the command body ran, so no DB or API work was done
+            msg = f"⏳ Please wait **{error.retry_after:.1f}s** before using this again."
+            if interaction.response.is_done():
+                await interaction.followup.send(msg, ephemeral=True)
+            else:
+                await interaction.response.send_message(msg, ephemeral=True)
+            return
+        await app_commands.CommandTree.on_error(self.tree, interaction, error)
+
+    def send_in_background(self, channel, interaction=None, **kwargs):
+        # The user's confirmation doesn't depend on this send, so don't make them wait on it.
+        # If it fails, the submitting interaction (when given) gets told instead.
+        self._track_send(channel.send(**kwargs), interaction)
+
+    def _track_send(self, coro, interaction=None):
+        task = asyncio.create_task(coro)
+        self._pending_sends.add(task)
+        task.add_done_callback(functools.partial(self._on_send_done, interaction))
+
+    def _on_send_done(self, interaction, task):
+        self._pending_sends.discard(task)
+        if task.cancelled() or task.exception() is None:
+            return
+        logger.error("❌ Background send failed: %s", task.exception())
+        if interaction is not None:
+            # They were already shown "Sent!", so correct that rather than drop the ticket silently
+            self._track_send(interaction.followup.send(SEND_FAILED_MSG, ephemeral=True))
+
+    async def close(self):
+        if self._pending_sends:
+            await asyncio.wait(self._pending_sends, timeout=5)
+        await super().close()
+        await db_manager.close()
+
     @tasks.loop(minutes=10)
     async def rotate_status(self):
-        statuses = [
-            "/ask | Vedic Wisdom",
-            "Helping Seekers",
-            "Reading scriptures...",
-            "Meditating on Dharma",
-            "/quiz | Test Knowledge"
-        ]
-        await self.change_presence(activity=discord.Activity(type=discord.ActivityType.listening, name=random.choice(statuses)))
+        await self.change_presence(activity=discord.Activity(type=discord.ActivityType.listening, name=random.choice(STATUS_MESSAGES)))
 
     @rotate_status.before_loop
     async def before_rotate(self):
         await self.wait_until_ready()
 
+# /profile ranks: RANK_NAMES[i] applies from RANK_THRESHOLDS[i-1] karma upwards
+RANK_THRESHOLDS = (50, 150, 300, 500)
+RANK_NAMES = (
+    "Sadhaka (Aspirant)",
+    "Brahmachari (Student)",
+    "Yogi (Practitioner)",
+    "Rishi (Sage)",
+    "Maharishi (Great Sage)",
+)
+
+# Fixed texts for /mantra, /meditate and /oracle
+MANTRAS = (
+    {"s": "Om Namah Shivaya", "m": "I bow to Shiva (The Self)", "b": "Peace, removal of fear, and spiritual awakening."},
+    {"s": "Om Gam Ganapataye Namaha", "m": "Salutations to Ganesha", "b": "Removal of obstacles and success in new ventures."},
+    {"s": "Gayatri Mantra", "m": "Om Bhur Bhuva Swaha...", "b": "Illumination of intellect and spiritual light."},
+    {"s": "Mahamrityunjaya Mantra", "m": "Om Tryambakam Yajamahe...", "b": "Healing, protection, and liberation from the fear of death."},
+    {"s": "Om Mani Padme Hum", "m": "The Jewel in the Lotus", "b": "Purification of the mind and cultivation of compassion."},
+)
+
+MEDITATION_STAGES = (
+    "🌬️ **Pranayama...** (Controlling breath) [==........]",
+    "👁️ **Pratyahara...** (Withdrawing senses) [====......]",
+    "🧠 **Dharana...** (Concentration) [======....]",
+    "🕉️ **Dhyana...** (Deep Meditation) [========..]",
+    "✨ **Samadhi...** (Oneness) [==========]",
+)
+
+MEDITATION_QUOTES = (
+    "“You have a right to perform your prescribed duties, but you are not entitled to the fruits of your actions.” – *Bhagavad Gita 2.47*",
+    "“Yoga is the journey of the self, through the self, to the self.” – *Bhagavad Gita 6.20*",
+    "“As a lamp in a windless place does not flicker, so is the disciplined mind of a yogi practicing meditation.” – *Bhagavad Gita 6.19*",
+)
+
+ORACLE_RESPONSES = (
+    "This path aligns with your Dharma.",
+    "Obstacles (Vighna) are present; perform selfless service (Seva) first.",
+    "The outcome depends on your past Karma.",
+    "Meditate on this; the answer lies within the Atman.",
+    "Detach from the result, focus only on the action (Karma Yoga).",
+)
+
 class QACog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # Static-KB matches per query. The static KB never changes after startup,
+        # so entries don't expire; DB matches are cached by DatabaseManager.
+        self._static_cache = OrderedDict()
 
-    def calculate_match_score(self, query: str, target: str) -> float:
-        stopwords = {'who', 'what', 'where', 'when', 'why', 'how', 'is', 'are', 'the', 'a', 'an', 'in', 'of', 'for', 'to', 'do', 'does', 'did'}
-        def clean_text(text):
-            words = ''.join(c for c in text.lower() if c.isalnum() or c.isspace()).split()
-            cleaned = [w for w in words if w not in stopwords]
-            return " ".join(cleaned)
-
-        query_clean = clean_text(query)
-        target_clean = clean_text(target)
-
+    def calculate_match_score(self, query_clean: str, query_lower: str, target_clean: str, target_lower: str) -> float:
+        # Inputs are pre-normalized with clean_text() / lower() by the caller
         if not query_clean:
-            query_clean = query.lower()
-            target_clean = target.lower()
+            query_clean = query_lower
+            target_clean = target_lower
 
         if query_clean and query_clean in target_clean:
             return 0.95
-        
-        return difflib.SequenceMatcher(None, query_clean, target_clean).ratio()
 
-    @app_commands.command(name="ask", description="Ask a question. Fuzzy matching included.")
-    async def ask(self, interaction: discord.Interaction, question: str):
-        await interaction.response.defer(ephemeral=False)
-        candidates = []
-        
-        for entry in STATIC_KNOWLEDGE_BASE:
-            score = self.calculate_match_score(question, entry['q'])
-            if score > 0.6: 
-                candidates.append({'q': entry['q'], 'a': entry['a'], 'score': score, 'source': 'static'})
+        # Normalized Indel similarity (2*LCS / total length), computed in C++.
+        # With the cutoff, RapidFuzz returns 0 early when the length difference alone
+        # rules out reaching the threshold, before running the LCS.
+        return fuzz.ratio(query_clean, target_clean, score_cutoff=MATCH_THRESHOLD * 100) / 100
 
-        db_rows = await db_manager.search_candidates(question)
+    def score_static(self, query_clean: str, query_lower: str):
+        matches = []
+        for entry in STATIC_KNOWLEDGE_BASE:
+            score = self.calculate_match_score(query_clean, query_lower, entry['q_clean'], entry['q_lower'])
+            if score > MATCH_THRESHOLD: 
+                matches.append({'q': entry['q'], 'a': entry['a'], 'label': entry['label'], 'score': score, 'source': 'static'})
+        return matches
+
+    async def match_static(self, query_clean: str, query_lower: str):
+        # Scores only depend on the lowercased query, so that's the cache key
+        cached = self._static_cache.get(query_lower)
+        if cached is not None:
+            self._static_cache.move_to_end(query_lower)
+            return cached
+
+        # Scoring the whole KB is the CPU-heavy part of /ask; run it on a worker
+        # thread so the event loop keeps servicing the gateway and other commands.
+        # The cache itself is only touched from the loop.
+        matches = await asyncio.to_thread(self.score_static, query_clean, query_lower)
+
+        self._static_cache[query_lower] = matches
+        if len(self._static_cache) > SEARCH_CACHE_SIZE:
+            self._static_cache.popitem(last=False)
+        return matches
+
+    async def find_candidates(self, question: str):
+        query_clean = clean_text(question)
+        query_lower = question.lower()
+        # Static scoring runs on a worker thread and the DB search is I/O, so overlap them
+        static_matches, db_rows = await asyncio.gather(
+            self.match_static(query_clean, query_lower),
+            db_manager.search_candidates(question),
+            return_exceptions=True,
+        )
+        if isinstance(static_matches, BaseException):
+            raise static_matches
+        if isinstance(db_rows, BaseException):
+            # The static knowledge base alone is still a useful answer
+            logger.warning("⚠️ DB search failed, using static matches only: %s", db_rows)
+            db_rows = []
+        # Best-scoring candidate per question, deduped as they're produced; on a tie
+        # the first one seen (static before DB) is kept
+        best = {}
+        def keep(candidate):
+            current = best.get(candidate['q'])
+            if current is None or candidate['score'] > current['score']:
+                best[candidate['q']] = candidate
+
+        for c in static_matches:
+            keep(c)
         for row in db_rows:
-            score = self.calculate_match_score(question, row['q'])
-            if score > 0.6:
-                candidates.append({'q': row['q'], 'a': row['a'], 'score': score, 'source': 'db'})
-
-        candidates.sort(key=lambda x: x['score'], reverse=True)
-        unique = []
-        seen = set()
-        for c in candidates:
-            if c['q'] not in seen:
-                unique.append(c)
-                seen.add(c['q'])
-        
-        candidates = unique
+            score = self.calculate_match_score(query_clean, query_lower, row['q_clean'], row['q_lower'])
+            if score > MATCH_THRESHOLD:
+                keep({'q': row['q'], 'a': row['a'], 'label': row['label'], 'score': score, 'source': 'db'})
+
+        return sorted(best.values(), key=lambda x: x['score'], reverse=True)
+
+    @app_commands.command(name="ask", description="Ask a question. Fuzzy matching included.")
+    @app_commands.checks.cooldown(1, 3.0, key=lambda i: i.user.id)
+    async def ask(self, interaction: discord.Interaction, question: str):
+        # Reply in a single round-trip when the lookup is quick (cache hits);
+        # only defer + follow up when it risks Discord's 3s response deadline.
+        lookup = asyncio.ensure_future(self.find_candidates(question))
+        # Discord's clock starts at creation, not when this handler got the event
+        elapsed = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+        done, _ = await asyncio.wait({lookup}, timeout=max(0.0, ASK_DEFER_AFTER - elapsed))
+        if not done:
+            await interaction.response.defer(ephemeral=False)
+        send = interaction.followup.send if interaction.response.is_done() else interaction.response.send_message
+        try:
+            candidates = await lookup
+        except Exception as e:
+            logger.error("❌ /ask lookup failed: %s", e)
+            await send("⚠️ Something went wrong while searching. Please try again.", ephemeral=True)
+            return
 
         if not candidates:
-            embed = discord.Embed(
-                title="🤔 No Answer Found",
-                description="I couldn't find a matching answer in the scriptures. Would you like to send this question to our **Experts**?",
-                color=WARNING_COLOR
-            )
             view = ConfirmSubmissionView(self.bot, question, interaction.user)
-            await interaction.followup.send(embed=embed, view=view)
+            await send(embed=NO_ANSWER_EMBED, view=view)
 
         elif len(candidates) == 1 and candidates[0]['score'] > 0.95:
-            best = candidates[0]
-            embed = discord.Embed(title="🕉️ Knowledge Base", description=best['a'], color=SUCCESS_COLOR)
-            embed.add_field(name="Topic", value=best['q'])
-            await interaction.followup.send(embed=embed)
+            await send(embed=knowledge_embed(candidates[0]))
         else:
-            await interaction.followup.send(
-                embed=discord.Embed(title="🔍 I found potential matches", description="Select the correct question, or send yours to the experts:", color=INFO_COLOR),
+            await send(
+                embed=MATCHES_EMBED,
                 view=DisambiguationView(candidates, self.bot, interaction.user, question)
             )
 
     @app_commands.command(name="daily", description="Claim your daily Karma reward (Every 24h).")
+    @app_commands.checks.cooldown(1, 5.0, key=lambda i: i.user.id)
     async def daily(self, interaction: discord.Interaction):
         success, wait_time = await db_manager.claim_daily(interaction.user.id)
         if not success:
@@ -553,14 +1110,7 @@ class QACog(commands.Cog):
 
     @app_commands.command(name="mantra", description="Receive a powerful Vedic Mantra for contemplation.")
     async def mantra(self, interaction: discord.Interaction):
-        mantras = [
-            {"s": "Om Namah Shivaya", "m": "I bow to Shiva (The Self)", "b": "Peace, removal of fear, and spiritual awakening."},
-            {"s": "Om Gam Ganapataye Namaha", "m": "Salutations to Ganesha", "b": "Removal of obstacles and success in new ventures."},
-            {"s": "Gayatri Mantra", "m": "Om Bhur Bhuva Swaha...", "b": "Illumination of intellect and spiritual light."},
-            {"s": "Mahamrityunjaya Mantra", "m": "Om Tryambakam Yajamahe...", "b": "Healing, protection, and liberation from the fear of death."},
-            {"s": "Om Mani Padme Hum", "m": "The Jewel in the Lotus", "b": "Purification of the mind and cultivation of compassion."}
-        ]
-        choice = random.choice(mantras)
+        choice = random.choice(MANTRAS)
         
         embed = discord.Embed(title="📿 Sacred Mantra", description=f"# {choice['s']}", color=MYSTIC_COLOR)
         embed.add_field(name="Meaning", value=choice['m'], inline=False)
@@ -568,20 +1118,27 @@ class QACog(commands.Cog):
         await interaction.response.send_message(embed=embed)
 
     @app_commands.command(name="quiz", description="Test your Vedic knowledge and earn Karma!")
+    @app_commands.checks.cooldown(1, 3.0, key=lambda i: i.user.id)
     async def quiz(self, interaction: discord.Interaction):
         if len(STATIC_KNOWLEDGE_BASE) < 4:
             await interaction.response.send_message("Not enough data for a quiz yet!", ephemeral=True)
             return
 
-        question_data = random.choice(STATIC_KNOWLEDGE_BASE)
+        # Draw question + distractors together: random.sample on the KB tuple picks
+        # a handful of entries without copying the whole answer list per quiz.
+        question_data, *others = random.sample(STATIC_KNOWLEDGE_BASE, 4)
         correct_answer = question_data['a']
-        distractors = random.sample([x['a'] for x in STATIC_KNOWLEDGE_BASE if x['q'] != question_data['q']], 3)
+        distractors = [x['a'] for x in others if x['q'] != question_data['q']]
+        if len(distractors) < 3:
+            # Drew a duplicate of the question; fall back to the full scan
+            distractors = random.sample([x['a'] for x in STATIC_KNOWLEDGE_BASE if x['q'] != question_data['q']], 3)
         
         embed = discord.Embed(title="🧠 Astra Wisdom Quiz", description=f"**Question:** {question_data['q']}", color=MYSTIC_COLOR)
         embed.set_footer(text="Select the correct answer below. (+5 Karma)")
         await interaction.response.send_message(embed=embed, view=QuizView(correct_answer, distractors))
 
     @app_commands.command(name="meditate", description="Perform a Dhyana (Meditation) session.")
+    @app_commands.checks.cooldown(1, 10.0, key=lambda i: i.user.id)
     async def meditate(self, interaction: discord.Interaction):
         success, wait_time = await db_manager.record_meditation(interaction.user.id)
         if not success:
@@ -592,25 +1149,13 @@ class QACog(commands.Cog):
         msg = await interaction.response.send_message("🧘 **Entering Asana...** (Posture)", ephemeral=False)
         msg = await interaction.original_response()
         
-        stages = [
-            "🌬️ **Pranayama...** (Controlling breath) [==........]",
-            "👁️ **Pratyahara...** (Withdrawing senses) [====......]",
-            "🧠 **Dharana...** (Concentration) [======....]",
-            "🕉️ **Dhyana...** (Deep Meditation) [========..]",
-            "✨ **Samadhi...** (Oneness) [==========]"
-        ]
-        
-        for stage in stages:
-            await asyncio.sleep(1.5)
-            await msg.edit(content=stage)
+        # Each edit's round trip runs during the pause that follows it, so stages tick
+        # every 1.5s instead of every 1.5s plus API latency
+        await asyncio.sleep(1.5)
+        for stage in MEDITATION_STAGES:
+            await asyncio.gather(msg.edit(content=stage), asyncio.sleep(1.5))
         
-        quotes = [
-            "“You have a right to perform your prescribed duties, but you are not entitled to the fruits of your actions.” – *Bhagavad Gita 2.47*",
-            "“Yoga is the journey of the self, through the self, to the self.” – *Bhagavad Gita 6.20*",
-            "“As a lamp in a windless place does not flicker, so is the disciplined mind of a yogi practicing meditation.” – *Bhagavad Gita 6.19*"
-        ]
-        
-        final_embed = discord.Embed(title="🙏 Shanti (Peace)", description=random.choice(quotes), color=SUCCESS_COLOR)
+        final_embed = discord.Embed(title="🙏 Shanti (Peace)", description=random.choice(MEDITATION_QUOTES), color=SUCCESS_COLOR)
         final_embed.set_footer(text="+10 Karma gained")
         await msg.edit(content="", embed=final_embed)
 
@@ -619,11 +1164,7 @@ class QACog(commands.Cog):
         row = await db_manager.get_user_profile(interaction.user.id)
         karma, meditations = row if row else (0, 0)
 
-        if karma < 50: rank = "Sadhaka (Aspirant)"
-        elif karma < 150: rank = "Brahmachari (Student)"
-        elif karma < 300: rank = "Yogi (Practitioner)"
-        elif karma < 500: rank = "Rishi (Sage)"
-        else: rank = "Maharishi (Great Sage)"
+        rank = RANK_NAMES[bisect.bisect_right(RANK_THRESHOLDS, karma)]
 
         embed = discord.Embed(title=f"📜 {interaction.user.display_name}'s Profile", color=INFO_COLOR)
         embed.set_thumbnail(url=interaction.user.display_avatar.url)
@@ -634,25 +1175,28 @@ class QACog(commands.Cog):
 
     @app_commands.command(name="oracle", description="Seek guidance from the Shastras.")
     async def oracle(self, interaction: discord.Interaction, query: str):
-        responses = [
-            "This path aligns with your Dharma.",
-            "Obstacles (Vighna) are present; perform selfless service (Seva) first.",
-            "The outcome depends on your past Karma.",
-            "Meditate on this; the answer lies within the Atman.",
-            "Detach from the result, focus only on the action (Karma Yoga)."
-        ]
         embed = discord.Embed(title="📜 Vedic Guidance", color=MYSTIC_COLOR)
         embed.add_field(name="Inquiry", value=query, inline=False)
-        embed.add_field(name="Insight", value=f"||{random.choice(responses)}||", inline=False)
+        embed.add_field(name="Insight", value=f"||{random.choice(ORACLE_RESPONSES)}||", inline=False)
         await interaction.response.send_message(embed=embed)
 
 async def main():
     token = os.getenv("DISCORD_TOKEN")
     if not token: return
     bot = AstraHomeBot()
+    # SIGTERM (Railway redeploys) / SIGINT close the bot and the DB pool cleanly
+    loop = asyncio.get_running_loop()
+    closing = []
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try: loop.add_signal_handler(sig, lambda: closing.append(asyncio.create_task(bot.close())))
+        except NotImplementedError: pass  # Windows: KeyboardInterrupt below still applies
     async with bot: await bot.start(token)
+    # __aexit__ only waits for discord.py's own shutdown, not the rest of our
+    # close() (the karma drain and pool close); don't let run() cancel it
+    if closing: await asyncio.gather(*closing)
 
 if __name__ == "__main__":
-    try: asyncio.run(main())
+    run = uvloop.run if uvloop else asyncio.run
+    try: run(main())
     except KeyboardInterrupt: pass
 